@@ -1,56 +1,396 @@
 from __future__ import annotations
-from typing import List
+from datetime import date
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+import heapq
+import math
+import operator
+import os
 import random
+import threading
+import uuid
 
-from project.models import User, Preferences
+import numpy as np
 
+from project import engine_kernels
+from project.features import features_for
+from project.models import EARTH_RADIUS_KM, Location, User, Preferences, _GENDER_ORD
 
-class RecommendationEngine:
-    """Simple in-memory recommendation engine using heuristics."""
 
-    def compute_matches(self, user: User, candidates: List[User], top_k: int = 10) -> List[User]:
-        scored = []
-        for cand in candidates:
-            if cand.user_id == user.user_id:
+GENDER_MATCH = 20.0
+GENDER_MISMATCH = -10.0
+AGE_MATCH = 15.0
+SHARED_INTEREST = 5.0
+COMPLETENESS = 0.1
+DISTANCE_PENALTY = 0.2
+DISTANCE_BONUS = 10.0
+NOISE_SCALE = 2.0
+
+_WORD = 0xFFFFFFFFFFFFFFFF
+
+# below this pool size the NumPy expressions beat the kernel's thread start-up cost
+KERNEL_MIN_CANDIDATES = 512
+# below this pool size compute_matches_parallel is not worth the thread hand-off
+PARALLEL_MIN_CANDIDATES = 512
+# compute_matches only scores candidates within this many times max_distance_km (or further
+# out if that is needed to keep the result exact, see RecommendationEngine._prefiltered_matches)
+PREFILTER_RADIUS_FACTOR = 10
+# widens the bounding box so float32 coordinates never drop a row inside the radius
+_BOX_SLACK_KM = 1.0
+
+_KERNEL_WEIGHTS = np.array([GENDER_MATCH, GENDER_MISMATCH, AGE_MATCH, SHARED_INTEREST, COMPLETENESS, DISTANCE_PENALTY, DISTANCE_BONUS, EARTH_RADIUS_KM])
+
+
+class CandidateMatrix:
+    """Column-oriented (SoA) snapshot of the candidate fields used for scoring.
+
+    Each attribute is a NumPy array with one row per candidate so that a whole
+    candidate pool can be scored with a handful of vectorized expressions
+    instead of walking every ``User -> Profile -> Preferences`` graph.
+    """
+
+    def __init__(self, users: List[User], today: Optional[date] = None):
+        today = today or date.today()
+        n = len(users)
+        self.users = list(users)
+        self.today = today
+        # the feature records the columns were filled from, for is_current()
+        self.features = [features_for(u, today) for u in users]
+        self.has_profile = np.zeros(n, dtype=np.bool_)
+        self.ages = np.zeros(n, dtype=np.int16)
+        self.lat = np.zeros(n, dtype=np.float32)
+        self.lon = np.zeros(n, dtype=np.float32)
+        self.has_location = np.zeros(n, dtype=np.bool_)
+        self.gender = np.full(n, -1, dtype=np.int8)
+        self.complete = np.zeros(n, dtype=np.int8)
+        # 128-bit user ids split in two so rows_of() is a vectorized compare
+        self.id_hi = np.empty(n, dtype=np.uint64)
+        self.id_lo = np.empty(n, dtype=np.uint64)
+
+        masks = []
+        for i, (u, f) in enumerate(zip(users, self.features)):
+            uid = u.user_id.int
+            self.id_hi[i] = uid >> 64
+            self.id_lo[i] = uid & _WORD
+            if f is None:
+                masks.append(0)
                 continue
-            score = self.score(user, cand)
-            scored.append((score, cand))
+            self.has_profile[i] = True
+            self.ages[i] = f.age_years
+            if f.has_location:
+                self.has_location[i] = True
+                self.lat[i] = f.lat
+                self.lon[i] = f.lon
+            self.gender[i] = f.gender_ord
+            self.complete[i] = f.complete_pct
+            masks.append(f.interest_mask)
+
+        words = max(1, (max(masks, default=0).bit_length() + 63) // 64)
+        self.interests_mask = _to_words(masks, words)
+
+    def __len__(self) -> int:
+        return len(self.users)
+
+    def __getitem__(self, rows) -> CandidateMatrix:
+        """The candidates in ``rows``, a slice (columns are views) or an array of row indices."""
+        sub = object.__new__(type(self))
+        picks = None if isinstance(rows, slice) else rows.tolist()
+        for name, value in vars(self).items():
+            if isinstance(value, np.ndarray):
+                value = value[rows]
+            elif isinstance(value, list):
+                value = value[rows] if picks is None else [value[i] for i in picks]
+            setattr(sub, name, value)
+        return sub
+
+    def is_current(self, users: List[User], today: date) -> bool:
+        """True if this matrix was built from exactly ``users`` and none of their features changed since."""
+        if self.today != today or len(users) != len(self.users) or not all(map(operator.is_, users, self.users)):
+            return False
+        return all(features_for(u, today) is f for u, f in zip(users, self.features))
+
+    def near(self, loc: Location, radius_km: float) -> np.ndarray:
+        """Boolean mask that keeps every row within ``radius_km`` of ``loc``, plus rows without a location.
+
+        A latitude band and a longitude band checked with plain array arithmetic; the
+        trigonometry is only done once, on scalars. Rows it keeps may still be further
+        away, but a row it drops is always beyond the radius, since for any two points
+        hav(d) >= hav(dlat) and hav(d) >= cos(lat1) * cos(lat2) * hav(dlon).
+        """
+        delta = (radius_km + _BOX_SLACK_KM) / EARTH_RADIUS_KM
+        if delta >= math.pi:
+            return np.ones(len(self), dtype=np.bool_)
+        keep = np.abs(self.lat - loc.lat) <= math.degrees(delta)
+
+        lat0 = math.radians(loc.lat)
+        floor = math.cos(lat0) * math.cos(min(math.pi / 2, abs(lat0) + delta))
+        h = math.sin(delta / 2) ** 2
+        if floor > h:
+            dlon = np.abs(self.lon - loc.lon)
+            keep &= np.minimum(dlon, 360.0 - dlon) <= math.degrees(2.0 * math.asin(math.sqrt(h / floor)))
+        return keep | ~self.has_location
+
+    def rows_of(self, user: User) -> np.ndarray:
+        """Boolean mask of the rows holding ``user`` (matched by user_id)."""
+        uid = user.user_id.int
+        return (self.id_hi == np.uint64(uid >> 64)) & (self.id_lo == np.uint64(uid & _WORD))
+
+    def scores(self, user: User, noise: np.ndarray, use_kernel: bool = True) -> np.ndarray:
+        """Score every candidate for ``user``; mirrors ``RecommendationEngine.score``.
+
+        ``use_kernel=False`` forces the NumPy expressions even where the Numba kernel would apply.
+        """
+        n = len(self)
+        if not user.profile:
+            return np.full(n, -1.0)
+
+        me = user.profile
+        pref: Preferences = me.preferences
+
+        # bits past the widest candidate mask cannot be shared, so _to_words drops them
+        me_mask = _to_words([pref._interest_mask], self.interests_mask.shape[1])
+
+        overflow = pref._interest_overflow
+        if overflow:
+            # interests past the registry cap have no bit; count them per row and ride along
+            # with the noise, which both paths add to every row that has a profile
+            shared = np.fromiter((len(overflow & f.interest_overflow) if f else 0 for f in self.features), dtype=np.float64, count=n)
+            noise = noise + SHARED_INTEREST * shared
+
+        if use_kernel and engine_kernels.HAVE_NUMBA and n >= KERNEL_MIN_CANDIDATES:
+            loc = me.location
+            return engine_kernels.score_all(
+                self.has_profile, self.ages, self.lat, self.lon, self.has_location, self.gender, self.complete,
+                self.interests_mask, _KERNEL_WEIGHTS, math.radians(loc.lat) if loc else 0.0, math.radians(loc.lon) if loc else 0.0,
+                math.cos(math.radians(loc.lat)) if loc else 1.0, loc is not None,
+                pref._gender_mask, pref.age_min, pref.age_max, float(pref.max_distance_km), me_mask[0], noise, np.empty(n),
+            )
+
+        gender_ok = (self.gender >= 0) & ((pref._gender_mask >> np.maximum(self.gender, 0).astype(np.int64)) & 1).astype(np.bool_)
+        scores = np.where(gender_ok, GENDER_MATCH, GENDER_MISMATCH)
+
+        ages = self.ages.astype(np.float64)
+        in_range = (ages >= pref.age_min) & (ages <= pref.age_max)
+        age_term = np.where(in_range, AGE_MATCH, np.where(ages < pref.age_min, ages - pref.age_min, pref.age_max - ages))
+        scores += np.where(self.ages != 0, age_term, 0.0)
+
+        shared = np.bitwise_count(self.interests_mask & me_mask).sum(axis=1)
+        scores += SHARED_INTEREST * shared
+
+        scores += COMPLETENESS * self.complete
+
+        if me.location is not None:
+            maxd = pref.max_distance_km
+            dist = me.location.distances_km_to_array(self.lat, self.lon).astype(np.float64)
+            dist_term = np.where(
+                dist > maxd,
+                -(dist - maxd) * DISTANCE_PENALTY,
+                np.maximum(0.0, (maxd - dist) / max(1, maxd)) * DISTANCE_BONUS,
+            )
+            scores += np.where(self.has_location, dist_term, 0.0)
+
+        scores += noise
+        return np.where(self.has_profile, scores, -1.0)
+
+
+def _to_words(masks: List[int], words: int) -> np.ndarray:
+    out = np.zeros((len(masks), words), dtype=np.uint64)
+    for i, m in enumerate(masks):
+        for w in range(words):
+            out[i, w] = (m >> (64 * w)) & _WORD
+    return out
+
+
+def top_k_indices(scores: np.ndarray, top_k: int) -> np.ndarray:
+    """Indices of the ``top_k`` highest scores, best first, in O(n + k log k)."""
+    if 0 < top_k < len(scores):
+        idx = np.argpartition(-scores, top_k)[:top_k]
+        return idx[np.argsort(-scores[idx], kind="stable")]
+    return np.argsort(-scores, kind="stable")[:top_k]
+
+
+def _select(user: User, matrix: CandidateMatrix, scores: np.ndarray, top_k: int) -> List[User]:
+    # the asking user can never be their own match; -inf keeps them out of the top k
+    scores[matrix.rows_of(user)] = -np.inf
+    idx = top_k_indices(scores, top_k)
+    return [matrix.users[i] for i in idx[scores[idx] > -np.inf]]
+
+
+def _top_scored(scored: List[Tuple[float, User]], top_k: int) -> List[User]:
+    if top_k <= 0:
         scored.sort(key=lambda x: x[0], reverse=True)
         return [c for _, c in scored[:top_k]]
+    return [c for _, c in heapq.nlargest(top_k, scored, key=lambda x: x[0])]
+
+
+# tie-breaker noise for the batch paths; tests can swap it for a seeded generator
+_rng = np.random.default_rng()
+
+
+def _noise(n: int) -> np.ndarray:
+    # one vectorized draw for the whole pool instead of a random.random() call per candidate
+    return _rng.random(n, dtype=np.float32) * np.float32(NOISE_SCALE)
+
+
+class RecommendationEngine:
+    """Simple in-memory recommendation engine using heuristics."""
+
+    def __init__(self, score_cache_size: int = 100_000):
+        # (a_id, b_id, a.profile_hash, b.profile_hash, today) -> base_score, evicted oldest-first.
+        # Serves the scalar API only: score()/base_score() callers, and compute_matches for
+        # subclasses that override score() on top of base_score(). The vectorized paths never
+        # call base_score; their repeat work is saved by reusing _matrix instead.
+        self._score_cache: Dict[Tuple[uuid.UUID, uuid.UUID, int, int, date], float] = {}
+        self.score_cache_size = score_cache_size
+        # compute_matches_parallel runs score() on pool threads; inserts and evictions
+        # take this lock so two threads never evict the same oldest key
+        self._score_cache_lock = threading.Lock()
+        # the last candidate pool's matrix, reused while the same users come back unchanged
+        self._matrix: Optional[CandidateMatrix] = None
+
+    def compute_matches(self, user: User, candidates: List[User], top_k: int = 10) -> List[User]:
+        cls = type(self)
+        if cls.score is not RecommendationEngine.score or cls.base_score is not RecommendationEngine.base_score:
+            # a subclass customised the scalar score, so the vectorized path does not apply
+            return _top_scored(self._score_each(user, candidates), top_k)
+
+        if not candidates:
+            return []
+        matrix = self._matrix_for(candidates)
+        if user.profile and user.profile.location is not None and top_k > 0:
+            matches = self._prefiltered_matches(user, matrix, top_k)
+            if matches is not None:
+                return matches
+        return _select(user, matrix, matrix.scores(user, _noise(len(matrix))), top_k)
+
+    def _prefiltered_matches(self, user: User, matrix: CandidateMatrix, top_k: int) -> Optional[List[User]]:
+        """Top ``top_k`` found by scoring only candidates near ``user``, or None to score them all.
+
+        Every term but distance is capped, so a candidate beyond the box radius scores at
+        most ``bound``. The shortlist is only trusted when its k-th best beats that bound,
+        which keeps the result identical to scoring the whole pool.
+        """
+        pref = user.profile.preferences
+        maxd = pref.max_distance_km
+        ceiling = GENDER_MATCH + AGE_MATCH + SHARED_INTEREST * len(pref._interest_set) + COMPLETENESS * 100 + NOISE_SCALE
+        radius = max(PREFILTER_RADIUS_FACTOR * maxd, maxd + ceiling / DISTANCE_PENALTY)
+        keep = matrix.near(user.profile.location, radius)
+        if keep.all():
+            return None
+
+        near = matrix[np.flatnonzero(keep)]
+        scores = near.scores(user, _noise(len(near)))
+        scores[near.rows_of(user)] = -np.inf
+        idx = top_k_indices(scores, top_k)
+        idx = idx[scores[idx] > -np.inf]
+        bound = ceiling - (radius - maxd) * DISTANCE_PENALTY
+        if len(idx) < top_k or scores[idx[-1]] <= bound:
+            return None
+        return [near.users[i] for i in idx]
+
+    def compute_matches_parallel(self, user: User, candidates: List[User], top_k: int = 10, workers: Optional[int] = None) -> List[User]:
+        """compute_matches() with the scoring sharded over a thread pool.
+
+        This is not the fast path. It only helps in two cases: a subclass's own score(),
+        called per shard, that waits on I/O or releases the GIL itself; and the default
+        score without Numba, where each shard runs the NumPy expressions (which release
+        the GIL) over a slice of the one shared candidate matrix. The shards skip the
+        bounding-box prefilter, so where the Numba kernel applies, and for pools smaller
+        than PARALLEL_MIN_CANDIDATES, this simply calls compute_matches().
+        """
+        cls = type(self)
+        overridden = cls.score is not RecommendationEngine.score or cls.base_score is not RecommendationEngine.base_score
+        kernel = not overridden and engine_kernels.HAVE_NUMBA and len(candidates) >= KERNEL_MIN_CANDIDATES
+        if kernel or len(candidates) < PARALLEL_MIN_CANDIDATES:
+            return self.compute_matches(user, candidates, top_k)
+        workers = workers or os.cpu_count() or 1
+        bounds = np.linspace(0, len(candidates), workers + 1).astype(int)
+        shards = [slice(lo, hi) for lo, hi in zip(bounds[:-1], bounds[1:]) if hi > lo]
+
+        if overridden:
+            with ThreadPoolExecutor(max_workers=len(shards)) as pool:
+                parts = list(pool.map(lambda rows: self._score_each(user, candidates[rows]), shards))
+            return _top_scored([pair for part in parts for pair in part], top_k)
+
+        matrix = self._matrix_for(candidates)
+        noise = _noise(len(matrix))
+        scores = np.empty(len(matrix))
+
+        def score_shard(rows: slice):
+            scores[rows] = matrix[rows].scores(user, noise[rows], use_kernel=False)
+
+        with ThreadPoolExecutor(max_workers=len(shards)) as pool:
+            list(pool.map(score_shard, shards))
+        return _select(user, matrix, scores, top_k)
+
+    def _score_each(self, user: User, candidates: List[User]) -> List[Tuple[float, User]]:
+        return [(self.score(user, c), c) for c in candidates if c.user_id != user.user_id]
+
+    def score_batch(self, user: User, candidates: List[User]) -> np.ndarray:
+        """Vectorized score() of ``user`` against every candidate, in candidate order."""
+        return self._matrix_for(candidates).scores(user, _noise(len(candidates)))
+
+    def _matrix_for(self, candidates: List[User]) -> CandidateMatrix:
+        today = date.today()
+        if self._matrix is None or not self._matrix.is_current(candidates, today):
+            self._matrix = CandidateMatrix(candidates, today)
+        return self._matrix
 
     def score(self, a: User, b: User) -> float:
+        """base_score plus a small random tie-breaker."""
+        score = self.base_score(a, b)
+        if not a.profile or not b.profile:
+            return score
+        return score + random.random() * NOISE_SCALE
+
+    def base_score(self, a: User, b: User) -> float:
+        """Deterministic part of score(); depends only on the two profiles, so it is cached.
+
+        The vectorized paths (compute_matches, score_batch) compute the same value from
+        CandidateMatrix columns and do not go through this cache.
+        """
         if not a.profile or not b.profile:
             return -1.0
 
+        key = (a.user_id, b.user_id, a.profile.profile_hash, b.profile.profile_hash, date.today())
+        cache = self._score_cache
+        score = cache.get(key)
+        if score is None:
+            score = self._compute_base_score(a, b)
+            with self._score_cache_lock:
+                if len(cache) >= self.score_cache_size:
+                    del cache[next(iter(cache))]
+                cache[key] = score
+        return score
+
+    def _compute_base_score(self, a: User, b: User) -> float:
         score = 0.0
 
         pref: Preferences = a.profile.preferences
-        if b.profile.gender and b.profile.gender in pref.gender_preference:
-            score += 20.0
+        if b.profile.gender is not None and (pref._gender_mask >> _GENDER_ORD[b.profile.gender]) & 1:
+            score += GENDER_MATCH
         else:
-            score -= 10.0
+            score += GENDER_MISMATCH
 
         b_age = b.profile.age()
         if b_age:
             if pref.matches_age(b_age):
-                score += 15.0
+                score += AGE_MATCH
             else:
                 if b_age < pref.age_min:
                     score -= float(pref.age_min - b_age)
                 elif b_age > pref.age_max:
                     score -= float(b_age - pref.age_max)
 
-        shared = set(pref.interests).intersection(set(b.profile.preferences.interests))
-        score += 5.0 * len(shared)
+        shared = pref.shared_interest_count(b.profile.preferences)
+        score += SHARED_INTEREST * shared
 
-        score += 0.1 * b.profile.complete_percentage()
+        score += COMPLETENESS * b.profile.complete_percentage()
 
         if a.profile.location and b.profile.location:
             dist = a.profile.location.distance_km_to(b.profile.location)
             if dist > pref.max_distance_km:
-                score -= (dist - pref.max_distance_km) * 0.2
+                score -= (dist - pref.max_distance_km) * DISTANCE_PENALTY
             else:
-                score += max(0, (pref.max_distance_km - dist) / max(1, pref.max_distance_km)) * 10.0
-
-        score += random.random() * 2.0
+                score += max(0, (pref.max_distance_km - dist) / max(1, pref.max_distance_km)) * DISTANCE_BONUS
         return score
@@ -0,0 +1,75 @@
+"""Compiled scoring kernels used by :mod:`project.engine` for large candidate pools.
+
+Numba is optional: without it ``HAVE_NUMBA`` is False and the engine keeps using
+its NumPy expressions, so these functions are only ever called when compiled.
+"""
+
+from __future__ import annotations
+import math
+
+import numpy as np
+
+try:
+    from numba import njit, prange
+
+    HAVE_NUMBA = True
+except ImportError:  # pragma: no cover - exercised only without numba installed
+    HAVE_NUMBA = False
+    prange = range
+
+    def njit(*args, **kwargs):
+        def wrap(fn):
+            return fn
+        return wrap
+
+
+# layout of the ``weights`` array passed to score_all
+W_GENDER_MATCH, W_GENDER_MISMATCH, W_AGE_MATCH, W_SHARED_INTEREST, W_COMPLETENESS, W_DISTANCE_PENALTY, W_DISTANCE_BONUS, W_EARTH_RADIUS = range(8)
+
+_RAD = math.pi / 180.0
+
+
+@njit(cache=True)
+def popcount64(x):
+    x = x - ((x >> np.uint64(1)) & np.uint64(0x5555555555555555))
+    x = (x & np.uint64(0x3333333333333333)) + ((x >> np.uint64(2)) & np.uint64(0x3333333333333333))
+    x = (x + (x >> np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+    return (x * np.uint64(0x0101010101010101)) >> np.uint64(56)
+
+
+@njit(parallel=True, fastmath=True, cache=True, error_model="numpy")
+def score_all(has_profile, ages, lats, lons, has_location, genders, completes, masks,
+              weights, me_lat_rad, me_lon_rad, cos_me_lat, use_distance, pref_gmask, amin, amax, maxd, me_mask, noise, out):
+    # Every branch below is written as a select (x if cond else y) with no early exits,
+    # which leaves LLVM free to vectorize the loop body; whether it does depends on the
+    # target CPU, and the trig calls only vectorize when Numba is built with SVML.
+    n = ages.shape[0]
+    words = masks.shape[1]
+    diameter = 2.0 * weights[W_EARTH_RADIUS]
+    bonus_scale = weights[W_DISTANCE_BONUS] / max(1.0, maxd)
+    for i in prange(n):
+        g = genders[i]
+        gender_ok = g >= 0 and (pref_gmask >> max(g, 0)) & 1 == 1
+        s = weights[W_GENDER_MATCH] if gender_ok else weights[W_GENDER_MISMATCH]
+
+        age = ages[i]
+        below = amin - age
+        above = age - amax
+        age_term = weights[W_AGE_MATCH] if below <= 0 and above <= 0 else float(-below if below > 0 else -above)
+        s += age_term if age != 0 else 0.0
+
+        shared = 0
+        for w in range(words):
+            shared += popcount64(masks[i, w] & me_mask[w])
+        s += weights[W_SHARED_INTEREST] * shared
+
+        s += weights[W_COMPLETENESS] * completes[i]
+
+        lat_r = lats[i] * _RAD
+        h = math.sin((lat_r - me_lat_rad) * 0.5) ** 2 + cos_me_lat * math.cos(lat_r) * math.sin((lons[i] * _RAD - me_lon_rad) * 0.5) ** 2
+        over = diameter * math.asin(math.sqrt(min(h, 1.0))) - maxd
+        dist_term = -over * weights[W_DISTANCE_PENALTY] if over > 0.0 else max(0.0, -over) * bonus_scale
+        s += dist_term if use_distance and has_location[i] else 0.0
+
+        out[i] = s + noise[i] if has_profile[i] else -1.0
+    return out
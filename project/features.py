@@ -0,0 +1,56 @@
+"""Flat per-profile feature records consumed by the batch scorer in :mod:`project.engine`."""
+
+from __future__ import annotations
+from dataclasses import dataclass
+from datetime import date
+from typing import FrozenSet, Optional
+
+from project.models import User, Profile, _GENDER_ORD
+
+
+@dataclass(slots=True, frozen=True)
+class ProfileFeatures:
+    age_years: int
+    complete_pct: int
+    interest_mask: int
+    interest_overflow: FrozenSet[str]
+    gender_ord: int
+    lat: float
+    lon: float
+    has_location: bool
+    # what the record was built from, so features_for can tell when it is stale
+    profile: Profile
+    revision: int
+    as_of: date
+
+
+def build_features(profile: Profile, today: Optional[date] = None) -> ProfileFeatures:
+    today = today or date.today()
+    loc = profile.location
+    return ProfileFeatures(
+        age_years=profile.age(today) or 0,
+        complete_pct=profile.complete_percentage(),
+        interest_mask=profile.preferences._interest_mask,
+        interest_overflow=profile.preferences._interest_overflow,
+        gender_ord=_GENDER_ORD[profile.gender] if profile.gender is not None else -1,
+        lat=loc.lat if loc is not None else 0.0,
+        lon=loc.lon if loc is not None else 0.0,
+        has_location=loc is not None,
+        profile=profile,
+        revision=profile._revision,
+        as_of=today,
+    )
+
+
+def features_for(user: User, today: Optional[date] = None) -> Optional[ProfileFeatures]:
+    """Return the user's cached features, rebuilding them if the profile changed since."""
+    p = user.profile
+    if not p:
+        return None
+    today = today or date.today()
+    f = user._features
+    prefs = p.preferences
+    if (f is None or f.profile is not p or f.revision != p._revision or f.as_of != today
+            or f.interest_mask != prefs._interest_mask or f.interest_overflow != prefs._interest_overflow):
+        f = user._features = build_features(p, today)
+    return f
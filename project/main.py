@@ -3,6 +3,7 @@
 
 from __future__ import annotations
 from datetime import date, timedelta
+from typing import List
 import random
 
 from project.utils import now
@@ -11,108 +12,6 @@ from project.storage import InMemoryDB
 from project.engine import RecommendationEngine
 
 
-def demo_setup(db: InMemoryDB, n: int = 8):
-    """Create n sample users with profiles for demo/testing."""
-    genders = list(Gender)
-    sample_users = []
-    base_lat = 37.7749
-    base_lon = -122.4194
-    for i in range(n):
-        u = User(email=f"user{i}@example.com")
-        u.set_password("password123")
-        u.verify_email()
-        p = Profile(
-            display_name=f"User{i}",
-            birthdate=date(1990 + (i % 10), 1 + (i % 12), 1 + (i % 28)),
-            gender=random.choice(genders),
-            bio=f"This is a short bio for user {i}. Likes hiking and coffee.",
-            location=Location(lat=base_lat + i * 0.01, lon=base_lon + i * 0.01, city="DemoCity", country="DemoLand"),
-        )
-        prefs = Preferences(
-            gender_preference=[random.choice(genders)],
-            age_min=20 + (i % 5),
-            age_max=40 + (i % 10),
-            max_distance_km=50 + (i * 5),
-            interests=["hiking", "coffee"] if i % 2 == 0 else ["movies", "music"],
-        )
-        p.preferences = prefs
-        ph = Photo()
-        p.add_photo(ph)
-        u.update_profile(p)
-        db.add_user(u)
-        sample_users.append(u)
-    return sample_users
-
-
-
-class RecommendationEngine:
-    """
-    Very small in-memory recommendation engine that scores candidate users for a given user.
-    Uses simple heuristics:
-    - Age preference match
-    - Gender preference match
-    - Shared interests
-    - Distance penalty
-    - Completeness bonus
-    """
-
-    def compute_matches(self, user: User, candidates: List[User], top_k: int = 10) -> List[User]:
-        scored = []
-        for cand in candidates:
-            if cand.user_id == user.user_id:
-                continue
-            score = self.score(user, cand)
-            scored.append((score, cand))
-        scored.sort(key=lambda x: x[0], reverse=True)
-        return [c for _, c in scored[:top_k]]
-
-    def score(self, a: User, b: User) -> float:
-        # Basic checks
-        if not a.profile or not b.profile:
-            return -1.0
-
-        score = 0.0
-
-        # gender preference
-        pref: Preferences = a.profile.preferences
-        if b.profile.gender and b.profile.gender in pref.gender_preference:
-            score += 20.0
-        else:
-            score -= 10.0
-
-        # age preference
-        b_age = b.profile.age()
-        if b_age:
-            if pref.matches_age(b_age):
-                score += 15.0
-            else:
-                # penalize by distance from range
-                if b_age < pref.age_min:
-                    score -= float(pref.age_min - b_age)
-                elif b_age > pref.age_max:
-                    score -= float(b_age - pref.age_max)
-
-        # shared interests
-        shared = set(pref.interests).intersection(set(b.profile.preferences.interests))
-        score += 5.0 * len(shared)
-
-        # profile completeness
-        score += 0.1 * b.profile.complete_percentage()
-
-        # distance
-        if a.profile.location and b.profile.location:
-            dist = a.profile.location.distance_km_to(b.profile.location)
-            # apply a penalty over max_distance_km
-            if dist > pref.max_distance_km:
-                score -= (dist - pref.max_distance_km) * 0.2
-            else:
-                score += max(0, (pref.max_distance_km - dist) / max(1, pref.max_distance_km)) * 10.0
-
-        # small random tie-breaker
-        score += random.random() * 2.0
-        return score
-
-
 # -------------------------
 # Small demo / sample usage
 # -------------------------
@@ -123,8 +22,10 @@ def demo_setup(db: InMemoryDB, n: int = 8) -> List[User]:
     sample_users = []
     base_lat = 37.7749
     base_lon = -122.4194
+    # one timestamp for the whole batch instead of a now() call per object
+    t = now()
     for i in range(n):
-        u = User(email=f"user{i}@example.com")
+        u = User(email=f"user{i}@example.com", created_at=t)
         u.set_password("password123")
         u.verify_email()
         p = Profile(
@@ -133,6 +34,8 @@ def demo_setup(db: InMemoryDB, n: int = 8) -> List[User]:
             gender=random.choice(genders),
             bio=f"This is a short bio for user {i}. Likes hiking and coffee.",
             location=Location(lat=base_lat + i * 0.01, lon=base_lon + i * 0.01, city="DemoCity", country="DemoLand"),
+            created_at=t,
+            updated_at=t,
         )
         # preferences
         prefs = Preferences(
@@ -1,11 +1,19 @@
 from __future__ import annotations
+import hmac
+import math
+import sys
 import uuid
 from dataclasses import dataclass, field
 from datetime import datetime, date
 from enum import Enum
-from typing import List, Optional, Dict, Any
+from typing import TYPE_CHECKING, List, Optional, Dict, Any, FrozenSet, Set, Tuple
 
-from project.utils import gen_uuid, now, hash_password, age_from_birthdate
+import numpy as np
+
+from project.utils import gen_uuid, now, now_ns, datetime_from_ns, hash_password, age_from_birthdate
+
+if TYPE_CHECKING:
+    from project.features import ProfileFeatures
 
 
 class Gender(Enum):
@@ -15,23 +23,130 @@ class Gender(Enum):
     OTHER = "other"
 
 
-@dataclass
+class _LazyUUID:
+    """Dataclass field default that only generates the UUID when it is first read.
+
+    For ids that are rarely looked at (message ids, unsaved payments) this skips
+    the uuid4() call entirely; the value lives in ``_<name>`` on the instance.
+    """
+
+    def __set_name__(self, owner, name: str):
+        self._attr = "_" + name
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return None
+        value = obj.__dict__.get(self._attr)
+        if value is None:
+            value = obj.__dict__[self._attr] = gen_uuid()
+        return value
+
+    def __set__(self, obj, value):
+        obj.__dict__[self._attr] = value
+
+
+_NOW = object()
+
+
+class _LazyTimestamp:
+    """Dataclass field default that records ``now_ns()`` and builds the datetime on first read.
+
+    Creation timestamps are mostly written and never looked at, so storing the
+    int skips the datetime construction; passing a datetime explicitly still works.
+    """
+
+    def __set_name__(self, owner, name: str):
+        self._attr = "_" + name
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return _NOW
+        value = obj.__dict__[self._attr]
+        if type(value) is int:
+            value = obj.__dict__[self._attr] = datetime_from_ns(value)
+        return value
+
+    def __set__(self, obj, value):
+        obj.__dict__[self._attr] = now_ns() if value is _NOW else value
+
+
+class _TrackedList(list):
+    """List that reports in-place changes to the object owning it.
+
+    Lets a model keep caches derived from a public list field (masks, counts)
+    in sync when callers mutate the list instead of assigning a new one.
+    """
+
+    __slots__ = ("_owner", "_name")
+
+    def __init__(self, items=(), owner=None, name: str = ""):
+        super().__init__(items)
+        self._owner = owner
+        self._name = name
+
+
+def _notifying(method_name: str):
+    method = getattr(list, method_name)
+
+    def wrapper(self, *args, **kwargs):
+        result = method(self, *args, **kwargs)
+        owner = getattr(self, "_owner", None)
+        # skipped while copy/pickle is still rebuilding the list or its owner
+        if owner is not None and getattr(owner, self._name, None) is self:
+            owner._field_changed(self._name)
+        return result
+
+    wrapper.__name__ = method_name
+    return wrapper
+
+
+for _method in ("append", "extend", "insert", "remove", "pop", "clear", "sort", "reverse",
+                "__setitem__", "__delitem__", "__iadd__", "__imul__"):
+    setattr(_TrackedList, _method, _notifying(_method))
+
+
+# stable small ints for Gender, used as bit positions in Preferences._gender_mask
+_GENDER_ORD: Dict[Gender, int] = {g: i for i, g in enumerate(Gender)}
+
+
+EARTH_RADIUS_KM = 6371.0
+
+
+@dataclass(slots=True, weakref_slot=True, frozen=True)
 class Location:
+    """Immutable, so one instance can be shared by many profiles."""
+
     lat: float
     lon: float
     city: str = ""
     country: str = ""
 
+    def __post_init__(self):
+        object.__setattr__(self, "city", sys.intern(self.city))
+        object.__setattr__(self, "country", sys.intern(self.country))
+
     def distance_km_to(self, other: "Location") -> float:
-        dx = (self.lat - other.lat) * 111.0
-        dy = (self.lon - other.lon) * 111.0
-        return (dx * dx + dy * dy) ** 0.5
+        """Great-circle (haversine) distance in km."""
+        lat1 = math.radians(self.lat)
+        lat2 = math.radians(other.lat)
+        h = math.sin((lat2 - lat1) * 0.5) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin(math.radians(other.lon - self.lon) * 0.5) ** 2
+        return 2.0 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(h, 1.0)))
+
+    def distances_km_to_array(self, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+        """Vectorized distance_km_to for many points given as parallel lat/lon arrays.
+
+        Keeps the input dtype, so float32 columns are processed at float32 width.
+        """
+        lat0 = math.radians(self.lat)
+        lats_r = np.radians(lats)
+        h = np.sin((lats_r - lat0) * 0.5) ** 2 + math.cos(lat0) * np.cos(lats_r) * np.sin(np.radians(lons - self.lon) * 0.5) ** 2
+        return 2.0 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(h, 1.0)))
 
     def to_dict(self) -> Dict[str, Any]:
         return {"lat": self.lat, "lon": self.lon, "city": self.city, "country": self.country}
 
 
-@dataclass
+@dataclass(slots=True, weakref_slot=True)
 class Photo:
     photo_id: uuid.UUID = field(default_factory=gen_uuid)
     url: str = ""
@@ -51,13 +166,84 @@ class Photo:
         return {"photo_id": str(self.photo_id), "url": self.url, "order": self.order, "uploaded_at": self.uploaded_at.isoformat() if self.uploaded_at else None}
 
 
-@dataclass
+# The first MAX_INTEREST_BITS distinct interests each get a bit, so overlaps can be counted
+# with int.bit_count(). Later ones stay plain strings (Preferences._interest_overflow): the cap
+# bounds how wide masks, and the engine's per-candidate mask columns, can grow. Whether a
+# given interest has a bit never changes, so mask and overflow overlaps never double count.
+MAX_INTEREST_BITS = 256
+_INTEREST_BITS: Dict[str, int] = {}
+
+
+def split_interests(interests: List[str]) -> Tuple[int, FrozenSet[str]]:
+    """Bitmask of the registered interests, and the set of those past the registry cap."""
+    mask = 0
+    overflow = []
+    for w in interests:
+        bit = _INTEREST_BITS.get(w)
+        if bit is None:
+            if len(_INTEREST_BITS) >= MAX_INTEREST_BITS:
+                overflow.append(w)
+                continue
+            bit = _INTEREST_BITS[w] = 1 << len(_INTEREST_BITS)
+        mask |= bit
+    return mask, frozenset(overflow)
+
+
+@dataclass(slots=True, weakref_slot=True)
 class Preferences:
     gender_preference: List[Gender] = field(default_factory=lambda: [Gender.FEMALE, Gender.MALE, Gender.NONBINARY])
     age_min: int = 18
     age_max: int = 99
     max_distance_km: int = 100
     interests: List[str] = field(default_factory=list)
+    # derived from `interests` / `gender_preference`, which are kept as _TrackedLists so
+    # in-place edits rebuild them too
+    _interest_set: FrozenSet[str] = field(default=frozenset(), init=False, repr=False, compare=False)
+    _interest_mask: int = field(default=0, init=False, repr=False, compare=False)
+    _interest_overflow: FrozenSet[str] = field(default=frozenset(), init=False, repr=False, compare=False)
+    _gender_mask: int = field(default=0, init=False, repr=False, compare=False)
+    # bumped on every public field assignment, so Profile.profile_hash knows to recompute
+    _revision: int = field(default=0, init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        self._rebuild_interests()
+        self._rebuild_gender_mask()
+
+    def __setattr__(self, name: str, value: Any):
+        if name == "interests" or name == "gender_preference":
+            value = _TrackedList(value, self, name)
+        object.__setattr__(self, name, value)
+        if not name.startswith("_"):
+            self._field_changed(name)
+
+    def _field_changed(self, name: str):
+        if name == "interests":
+            self._rebuild_interests()
+        elif name == "gender_preference":
+            self._rebuild_gender_mask()
+        object.__setattr__(self, "_revision", getattr(self, "_revision", 0) + 1)
+
+    def _rebuild_gender_mask(self):
+        mask = 0
+        for g in self.gender_preference:
+            mask |= 1 << _GENDER_ORD[g]
+        object.__setattr__(self, "_gender_mask", mask)
+
+    def _rebuild_interests(self):
+        # interned like Location's city/country, so the registry and set lookups hit on identity
+        interests = self.interests
+        # list's own __setitem__, so interning in place does not re-trigger the rebuild
+        list.__setitem__(interests, slice(None), [sys.intern(w) for w in interests])
+        object.__setattr__(self, "_interest_set", frozenset(interests))
+        mask, overflow = split_interests(interests)
+        object.__setattr__(self, "_interest_mask", mask)
+        object.__setattr__(self, "_interest_overflow", overflow)
+
+    def shared_interest_count(self, other: Preferences) -> int:
+        shared = (self._interest_mask & other._interest_mask).bit_count()
+        if self._interest_overflow and other._interest_overflow:
+            shared += len(self._interest_overflow & other._interest_overflow)
+        return shared
 
     def matches_age(self, age: int) -> bool:
         return self.age_min <= age <= self.age_max
@@ -72,7 +258,7 @@ class Preferences:
         }
 
 
-@dataclass
+@dataclass(slots=True, weakref_slot=True)
 class Profile:
     profile_id: uuid.UUID = field(default_factory=gen_uuid)
     display_name: str = ""
@@ -84,8 +270,43 @@ class Profile:
     preferences: Preferences = field(default_factory=Preferences)
     created_at: datetime = field(default_factory=now)
     updated_at: datetime = field(default_factory=now)
+    # memoized results; any field assignment (mutators bump updated_at) or in-place change to
+    # `photos` drops the completeness cache and bumps _revision, which tells derived records
+    # such as ProfileFeatures and profile_hash to rebuild
+    _age_cache: Optional[Tuple[date, date, int]] = field(default=None, init=False, repr=False, compare=False)
+    _complete_cache: Optional[int] = field(default=None, init=False, repr=False, compare=False)
+    _revision: int = field(default=0, init=False, repr=False, compare=False)
+    _hash_cache: Optional[Tuple[int, int, int]] = field(default=None, init=False, repr=False, compare=False)
+
+    def __setattr__(self, name: str, value: Any):
+        if name == "photos":
+            # tracked, so appending to or deleting from the list also invalidates the caches
+            value = _TrackedList(value, self, name)
+        object.__setattr__(self, name, value)
+        if not name.startswith("_"):
+            self._field_changed(name)
+
+    def _field_changed(self, name: str):
+        object.__setattr__(self, "_complete_cache", None)
+        object.__setattr__(self, "_revision", getattr(self, "_revision", 0) + 1)
+
+    @property
+    def profile_hash(self) -> int:
+        """Hash of everything that feeds scoring; recomputed only after the profile or its preferences change."""
+        prefs = self.preferences
+        cached = self._hash_cache
+        if cached is not None and cached[0] == self._revision and cached[1] == prefs._revision:
+            return cached[2]
+        value = hash((
+            self.display_name, self.birthdate, self.gender, self.bio, len(self.photos), self.location,
+            tuple(prefs.gender_preference), prefs.age_min, prefs.age_max, prefs.max_distance_km, prefs._interest_set,
+        ))
+        self._hash_cache = (self._revision, prefs._revision, value)
+        return value
 
     def complete_percentage(self) -> int:
+        if self._complete_cache is not None:
+            return self._complete_cache
         score = 0
         total = 6
         if self.display_name:
@@ -100,7 +321,8 @@ class Profile:
             score += 1
         if self.location:
             score += 1
-        return int((score / total) * 100)
+        self._complete_cache = int((score / total) * 100)
+        return self._complete_cache
 
     def add_photo(self, photo: Photo):
         photo.order = len(self.photos)
@@ -109,15 +331,26 @@ class Profile:
         self.updated_at = now()
 
     def remove_photo(self, photo_id: uuid.UUID):
-        self.photos = [p for p in self.photos if p.photo_id != photo_id]
-        for i, p in enumerate(self.photos):
-            p.order = i
+        photos = self.photos
+        for i, p in enumerate(photos):
+            if p.photo_id == photo_id:
+                del photos[i]
+                # only the photos after the removed one change position
+                for j in range(i, len(photos)):
+                    photos[j].order = j
+                break
         self.updated_at = now()
 
-    def age(self) -> Optional[int]:
+    def age(self, today: Optional[date] = None) -> Optional[int]:
         if not self.birthdate:
             return None
-        return age_from_birthdate(self.birthdate)
+        today = today or date.today()
+        cached = self._age_cache
+        if cached and cached[0] == self.birthdate and cached[1] == today:
+            return cached[2]
+        years = age_from_birthdate(self.birthdate, today)
+        self._age_cache = (self.birthdate, today, years)
+        return years
 
     def to_dict(self) -> Dict[str, Any]:
         return {
@@ -134,22 +367,35 @@ class Profile:
         }
 
 
-@dataclass
+@dataclass(slots=True, weakref_slot=True, kw_only=True)
 class User:
+    # Slot order is memory order: the fields read while matching come first so they
+    # share the instance's first cache line; auth/bookkeeping fields follow.
+    # kw_only keeps the reordering from silently shifting positional arguments.
     user_id: uuid.UUID = field(default_factory=gen_uuid)
+    profile: Optional[Profile] = None
+    _features: Optional[ProfileFeatures] = field(default=None, init=False, repr=False, compare=False)
+    is_active: bool = True
     email: str = ""
+    email_verified: bool = False
     password_hash: str = ""
     created_at: datetime = field(default_factory=now)
     last_login: Optional[datetime] = None
-    is_active: bool = True
-    profile: Optional[Profile] = None
-    email_verified: bool = False
+    _id_str: Optional[Tuple[uuid.UUID, str]] = field(default=None, init=False, repr=False, compare=False)
+
+    @property
+    def id_str(self) -> str:
+        """``str(user_id)``, memoized since every related model's to_dict needs it."""
+        cached = self._id_str
+        if cached is None or cached[0] is not self.user_id:
+            cached = self._id_str = (self.user_id, str(self.user_id))
+        return cached[1]
 
     def set_password(self, password: str):
         self.password_hash = hash_password(password)
 
     def verify_password(self, password: str) -> bool:
-        return self.password_hash == hash_password(password)
+        return hmac.compare_digest(self.password_hash, hash_password(password))
 
     def verify_email(self) -> bool:
         self.email_verified = True
@@ -158,13 +404,14 @@ class User:
     def update_profile(self, p: Profile):
         self.profile = p
         self.profile.updated_at = now()
+        self._features = None
 
     def login(self) -> None:
         self.last_login = now()
 
     def to_dict(self) -> Dict[str, Any]:
         return {
-            "user_id": str(self.user_id),
+            "user_id": self.id_str,
             "email": self.email,
             "created_at": self.created_at.isoformat(),
             "last_login": self.last_login.isoformat() if self.last_login else None,
@@ -174,7 +421,7 @@ class User:
         }
 
 
-@dataclass
+@dataclass(slots=True, weakref_slot=True)
 class Swipe:
     swipe_id: uuid.UUID = field(default_factory=gen_uuid)
     from_user: User = None
@@ -185,8 +432,8 @@ class Swipe:
     def to_dict(self) -> Dict[str, Any]:
         return {
             "swipe_id": str(self.swipe_id),
-            "from_user": str(self.from_user.user_id) if self.from_user else None,
-            "to_user": str(self.to_user.user_id) if self.to_user else None,
+            "from_user": self.from_user.id_str if self.from_user else None,
+            "to_user": self.to_user.id_str if self.to_user else None,
             "direction": self.direction,
             "timestamp": self.timestamp.isoformat(),
         }
@@ -197,7 +444,7 @@ class Match:
     match_id: uuid.UUID = field(default_factory=gen_uuid)
     user_a: User = None
     user_b: User = None
-    created_at: datetime = field(default_factory=now)
+    created_at: datetime = _LazyTimestamp()
     is_active: bool = True
 
     def unmatch(self):
@@ -213,8 +460,8 @@ class Match:
     def to_dict(self) -> Dict[str, Any]:
         return {
             "match_id": str(self.match_id),
-            "user_a": str(self.user_a.user_id) if self.user_a else None,
-            "user_b": str(self.user_b.user_id) if self.user_b else None,
+            "user_a": self.user_a.id_str if self.user_a else None,
+            "user_b": self.user_b.id_str if self.user_b else None,
             "created_at": self.created_at.isoformat(),
             "is_active": self.is_active,
         }
@@ -222,10 +469,10 @@ class Match:
 
 @dataclass
 class Message:
-    message_id: uuid.UUID = field(default_factory=gen_uuid)
+    message_id: uuid.UUID = _LazyUUID()
     sender: User = None
     content: str = ""
-    sent_at: datetime = field(default_factory=now)
+    sent_at: datetime = _LazyTimestamp()
     edited_at: Optional[datetime] = None
     is_read: bool = False
 
@@ -239,7 +486,7 @@ class Message:
     def to_dict(self) -> Dict[str, Any]:
         return {
             "message_id": str(self.message_id),
-            "sender": str(self.sender.user_id) if self.sender else None,
+            "sender": self.sender.id_str if self.sender else None,
             "content": self.content,
             "sent_at": self.sent_at.isoformat(),
             "edited_at": self.edited_at.isoformat() if self.edited_at else None,
@@ -251,32 +498,54 @@ class Message:
 class Conversation:
     conversation_id: uuid.UUID = field(default_factory=gen_uuid)
     participants: List[User] = field(default_factory=list)
-    created_at: datetime = field(default_factory=now)
+    created_at: datetime = _LazyTimestamp()
     last_message_at: Optional[datetime] = None
     messages: List[Message] = field(default_factory=list)
+    # mirrors `participants`, which is a _TrackedList so assignment and in-place edits both resync
+    _participant_ids: Set[uuid.UUID] = field(default_factory=set, init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        self._field_changed("participants")
+
+    def __setattr__(self, name: str, value: Any):
+        if name == "participants":
+            value = _TrackedList(value, self, name)
+        object.__setattr__(self, name, value)
+        if name == "participants":
+            self._field_changed(name)
+
+    def _field_changed(self, name: str):
+        self._participant_ids = {p.user_id for p in self.participants}
 
     def send_message(self, m: Message) -> Message:
-        if not any(p.user_id == m.sender.user_id for p in self.participants):
-            raise ValueError("Sender not in conversation participants")
+        sender_id = m.sender.user_id
+        if sender_id not in self._participant_ids:
+            # the set goes stale if a participant's user_id is reassigned after joining,
+            # so check the list itself before rejecting the sender
+            if not any(p.user_id == sender_id for p in self.participants):
+                raise ValueError("Sender not in conversation participants")
+            self._field_changed("participants")
         self.messages.append(m)
         self.last_message_at = m.sent_at
         return m
 
     def add_participant(self, user: User):
-        if not any(u.user_id == user.user_id for u in self.participants):
-            self.participants.append(user)
+        if user.user_id not in self._participant_ids:
+            self._participant_ids.add(user.user_id)
+            # plain list.append: the tracked append would rebuild the whole id set
+            list.append(self.participants, user)
 
     def to_dict(self) -> Dict[str, Any]:
         return {
             "conversation_id": str(self.conversation_id),
-            "participants": [str(p.user_id) for p in self.participants],
+            "participants": [p.id_str for p in self.participants],
             "created_at": self.created_at.isoformat(),
             "last_message_at": self.last_message_at.isoformat() if self.last_message_at else None,
             "messages": [m.to_dict() for m in self.messages],
         }
 
 
-@dataclass
+@dataclass(slots=True, weakref_slot=True)
 class Notification:
     notification_id: uuid.UUID = field(default_factory=gen_uuid)
     user: User = None
@@ -291,7 +560,7 @@ class Notification:
     def to_dict(self) -> Dict[str, Any]:
         return {
             "notification_id": str(self.notification_id),
-            "user": str(self.user.user_id) if self.user else None,
+            "user": self.user.id_str if self.user else None,
             "type": self.type,
             "payload": self.payload,
             "sent_at": self.sent_at.isoformat(),
@@ -305,7 +574,7 @@ class Report:
     reporter: User = None
     reported_user: User = None
     reason: str = ""
-    created_at: datetime = field(default_factory=now)
+    created_at: datetime = _LazyTimestamp()
     resolved_at: Optional[datetime] = None
     resolution: Optional[str] = None
 
@@ -316,8 +585,8 @@ class Report:
     def to_dict(self) -> Dict[str, Any]:
         return {
             "report_id": str(self.report_id),
-            "reporter": str(self.reporter.user_id) if self.reporter else None,
-            "reported_user": str(self.reported_user.user_id) if self.reported_user else None,
+            "reporter": self.reporter.id_str if self.reporter else None,
+            "reported_user": self.reported_user.id_str if self.reported_user else None,
             "reason": self.reason,
             "created_at": self.created_at.isoformat(),
             "resolved_at": self.resolved_at.isoformat() if self.resolved_at else None,
@@ -325,7 +594,7 @@ class Report:
         }
 
 
-@dataclass
+@dataclass(slots=True, weakref_slot=True)
 class Subscription:
     sub_id: uuid.UUID = field(default_factory=gen_uuid)
     user: User = None
@@ -343,7 +612,7 @@ class Subscription:
     def to_dict(self) -> Dict[str, Any]:
         return {
             "sub_id": str(self.sub_id),
-            "user": str(self.user.user_id) if self.user else None,
+            "user": self.user.id_str if self.user else None,
             "tier": self.tier,
             "started_at": self.started_at.isoformat(),
             "expires_at": self.expires_at.isoformat() if self.expires_at else None,
@@ -355,12 +624,12 @@ import random
 
 @dataclass
 class Payment:
-    payment_id: uuid.UUID = field(default_factory=gen_uuid)
+    payment_id: uuid.UUID = _LazyUUID()
     user: User = None
     amount: float = 0.0
     currency: str = "USD"
     status: str = "pending"
-    created_at: datetime = field(default_factory=now)
+    created_at: datetime = _LazyTimestamp()
 
     def charge(self) -> bool:
         """Attempt to charge and return True on success, False on failure.
@@ -377,7 +646,7 @@ class Payment:
     def to_dict(self) -> Dict[str, Any]:
         return {
             "payment_id": str(self.payment_id),
-            "user": str(self.user.user_id) if self.user else None,
+            "user": self.user.id_str if self.user else None,
             "amount": self.amount,
             "currency": self.currency,
             "status": self.status,
@@ -1,10 +1,15 @@
 from __future__ import annotations
-from typing import Dict, Optional
+from typing import Dict, Optional, Tuple, Union
 import uuid
 
+from project.features import build_features
 from project.models import User, Swipe, Match, Conversation, Notification, Report, Subscription, Payment
 
 
+def _pair_key(a: int, b: int) -> Tuple[int, int]:
+    return (a, b) if a < b else (b, a)
+
+
 class InMemoryDB:
     def __init__(self):
         self.users: Dict[uuid.UUID, User] = {}
@@ -15,35 +20,46 @@ class InMemoryDB:
         self.reports: Dict[uuid.UUID, Report] = {}
         self.subscriptions: Dict[uuid.UUID, Subscription] = {}
         self.payments: Dict[uuid.UUID, Payment] = {}
+        # case-folded email -> first user registered with it
+        self._email_index: Dict[str, User] = {}
+        # (from_id, to_id) -> direction of the latest swipe, and unordered id pair -> its match.
+        # Keyed on UUID.int: UUID.__hash__ is a Python-level call, int hashing is not.
+        self._swipes_by_pair: Dict[Tuple[int, int], str] = {}
+        self._match_by_pair: Dict[Tuple[int, int], Match] = {}
 
     def add_user(self, user: User):
         self.users[user.user_id] = user
+        if user.profile:
+            user._features = build_features(user.profile)
+        self._email_index.setdefault(user.email.casefold(), user)
+
+    def find_user(self, user_id: Union[uuid.UUID, bytes]) -> Optional[User]:
+        if isinstance(user_id, bytes):
+            if len(user_id) != 16:
+                return None
+            user_id = uuid.UUID(bytes=user_id)
+        return self.users.get(user_id)
 
     def find_user_by_email(self, email: str) -> Optional[User]:
-        for u in self.users.values():
-            if u.email.lower() == email.lower():
-                return u
-        return None
+        return self._email_index.get(email.casefold())
 
     def add_swipe(self, swipe: Swipe):
         self.swipes[swipe.swipe_id] = swipe
-        if swipe.direction == "like":
-            for other in self.swipes.values():
-                if other.from_user.user_id == swipe.to_user.user_id and other.to_user.user_id == swipe.from_user.user_id and other.direction == "like":
-                    if not self._match_exists_between(swipe.from_user, swipe.to_user):
-                        m = Match(user_a=swipe.from_user, user_b=swipe.to_user)
-                        self.matches[m.match_id] = m
-                        return m
+        a, b = swipe.from_user.user_id.int, swipe.to_user.user_id.int
+        self._swipes_by_pair[(a, b)] = swipe.direction
+        if swipe.direction == "like" and self._swipes_by_pair.get((b, a)) == "like":
+            if _pair_key(a, b) not in self._match_by_pair:
+                m = Match(user_a=swipe.from_user, user_b=swipe.to_user)
+                self.add_match(m)
+                return m
         return None
 
-    def _match_exists_between(self, a: User, b: User) -> bool:
-        for m in self.matches.values():
-            if (m.user_a.user_id == a.user_id and m.user_b.user_id == b.user_id) or (m.user_a.user_id == b.user_id and m.user_b.user_id == a.user_id):
-                return True
-        return False
+    def match_between(self, a: User, b: User) -> Optional[Match]:
+        return self._match_by_pair.get(_pair_key(a.user_id.int, b.user_id.int))
 
     def add_match(self, match: Match):
         self.matches[match.match_id] = match
+        self._match_by_pair.setdefault(_pair_key(match.user_a.user_id.int, match.user_b.user_id.int), match)
 
     def add_conversation(self, conv: Conversation):
         self.conversations[conv.conversation_id] = conv
@@ -1,7 +1,19 @@
 import sys
 import os
 
+import pytest
+
 # Ensure repository root is on sys.path so `import project.*` works when running pytest from workspace root
 repo_root = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, os.pardir))
 if repo_root not in sys.path:
     sys.path.insert(0, repo_root)
+
+from project.engine import RecommendationEngine
+
+
+@pytest.fixture(scope="session")
+def engine():
+    # One instance for the whole session, so its score cache and cached candidate matrix
+    # carry over between tests. Tests must not depend on that state: anything asserting
+    # on _score_cache or _matrix builds its own RecommendationEngine.
+    return RecommendationEngine()
@@ -1,38 +1,48 @@
 import random
+import threading
+import time
 from datetime import date
 
+import numpy as np
 import pytest
 
-from project.engine import RecommendationEngine
+from project import engine as engine_module
+from project import models
+from project.engine import CandidateMatrix, RecommendationEngine, top_k_indices
 from project.models import User, Profile, Preferences, Location, Gender, Photo
 
 
 def make_user_with_profile(index: int, gender: Gender = Gender.FEMALE, age: int = 30, interests=None, lat=None, lon=None):
-    u = User(email=f"u{index}@example.com")
-    # compute birthdate such that age is roughly `age`
-    today = date.today()
-    birth_year = today.year - age
-    bd = date(birth_year, 1, 1)
-    p = Profile(display_name=f"User{index}", birthdate=bd, gender=gender, bio="bio")
-    if interests is not None:
-        p.preferences.interests = list(interests)
-    if lat is not None and lon is not None:
-        p.location = Location(lat=lat, lon=lon)
-    # add a photo to increase completeness if desired
-    p.add_photo(Photo())
-    u.update_profile(p)
-    return u
-
-
-def test_score_missing_profile_returns_negative():
-    eng = RecommendationEngine()
+    return make_users(1, start=index, gender=gender, age=age, interests=interests, lat=lat, lon=lon)[0]
+
+
+def make_users(n: int, start: int = 0, gender: Gender = Gender.FEMALE, age: int = 30, interests=None, lat=None, lon=None):
+    """Users start..start+n-1 sharing the same profile settings."""
+    # compute birthdate such that age is roughly `age`; the same for every user
+    bd = date(date.today().year - age, 1, 1)
+    location = Location(lat=lat, lon=lon) if lat is not None and lon is not None else None
+    users = []
+    for index in range(start, start + n):
+        u = User(email=f"u{index}@example.com")
+        p = Profile(display_name=f"User{index}", birthdate=bd, gender=gender, bio="bio")
+        if interests is not None:
+            p.preferences.interests = list(interests)
+        if location is not None:
+            p.location = location
+        # add a photo to increase completeness if desired
+        p.add_photo(Photo())
+        u.update_profile(p)
+        users.append(u)
+    return users
+
+
+def test_score_missing_profile_returns_negative(engine):
     a = User(email="a@example.com")
     b = User(email="b@example.com")
-    assert eng.score(a, b) == -1.0
+    assert engine.score(a, b) == -1.0
 
 
-def test_gender_match_higher_than_mismatch(monkeypatch):
-    eng = RecommendationEngine()
+def test_gender_match_higher_than_mismatch(engine, monkeypatch):
     a = make_user_with_profile(1, gender=Gender.FEMALE)
     # prefer FEMALE
     a.profile.preferences.gender_preference = [Gender.FEMALE]
@@ -43,13 +53,12 @@ def test_gender_match_higher_than_mismatch(monkeypatch):
     # make randomness deterministic
     monkeypatch.setattr(random, "random", lambda: 0.0)
 
-    score_match = eng.score(a, b_match)
-    score_mismatch = eng.score(a, b_mismatch)
+    score_match = engine.score(a, b_match)
+    score_mismatch = engine.score(a, b_mismatch)
     assert score_match > score_mismatch
 
 
-def test_age_within_range_vs_outside(monkeypatch):
-    eng = RecommendationEngine()
+def test_age_within_range_vs_outside(engine, monkeypatch):
     a = make_user_with_profile(1)
     a.profile.preferences.age_min = 25
     a.profile.preferences.age_max = 35
@@ -60,29 +69,27 @@ def test_age_within_range_vs_outside(monkeypatch):
 
     monkeypatch.setattr(random, "random", lambda: 0.0)
 
-    s_inside = eng.score(a, b_inside)
-    s_below = eng.score(a, b_below)
-    s_above = eng.score(a, b_above)
+    s_inside = engine.score(a, b_inside)
+    s_below = engine.score(a, b_below)
+    s_above = engine.score(a, b_above)
 
     assert s_inside > s_below
     assert s_inside > s_above
 
 
-def test_shared_interests_increase(monkeypatch):
-    eng = RecommendationEngine()
+def test_shared_interests_increase(engine, monkeypatch):
     a = make_user_with_profile(1, interests=["hiking", "coffee"])
     b_shared = make_user_with_profile(2, interests=["hiking", "music"])
     b_none = make_user_with_profile(3, interests=["movies"])
 
     monkeypatch.setattr(random, "random", lambda: 0.0)
 
-    s_shared = eng.score(a, b_shared)
-    s_none = eng.score(a, b_none)
+    s_shared = engine.score(a, b_shared)
+    s_none = engine.score(a, b_none)
     assert s_shared > s_none
 
 
-def test_profile_completeness_increases_score(monkeypatch):
-    eng = RecommendationEngine()
+def test_profile_completeness_increases_score(engine, monkeypatch):
     a = make_user_with_profile(1, interests=[])
     b_incomplete = make_user_with_profile(2, interests=[])
     # make b_complete more complete (add photo already exists then add bio and location)
@@ -92,13 +99,12 @@ def test_profile_completeness_increases_score(monkeypatch):
 
     monkeypatch.setattr(random, "random", lambda: 0.0)
 
-    s_incomplete = eng.score(a, b_incomplete)
-    s_complete = eng.score(a, b_complete)
+    s_incomplete = engine.score(a, b_incomplete)
+    s_complete = engine.score(a, b_complete)
     assert s_complete > s_incomplete
 
 
-def test_distance_penalty_and_bonus(monkeypatch):
-    eng = RecommendationEngine()
+def test_distance_penalty_and_bonus(engine, monkeypatch):
     a = make_user_with_profile(1, lat=37.0, lon=-122.0)
     # set a pref max_distance small so far user is penalized
     a.profile.preferences.max_distance_km = 5
@@ -108,66 +114,391 @@ def test_distance_penalty_and_bonus(monkeypatch):
 
     monkeypatch.setattr(random, "random", lambda: 0.0)
 
-    s_near = eng.score(a, b_near)
-    s_far = eng.score(a, b_far)
+    s_near = engine.score(a, b_near)
+    s_far = engine.score(a, b_far)
     assert s_near > s_far
 
 
-def test_compute_matches_returns_top_k(monkeypatch):
-    eng = RecommendationEngine()
+def test_compute_matches_returns_top_k(engine, monkeypatch):
     a = make_user_with_profile(1)
-    candidates = [make_user_with_profile(i) for i in range(2, 12)]
+    candidates = make_users(10, start=2)
     # adjust one candidate to be clearly best
     candidates[3].profile.preferences.interests = ["hiking", "coffee"]
     a.profile.preferences.interests = ["hiking"]
 
     monkeypatch.setattr(random, "random", lambda: 0.0)
 
-    top5 = eng.compute_matches(a, candidates, top_k=5)
+    top5 = engine.compute_matches(a, candidates, top_k=5)
     assert len(top5) == 5
     # ensure ordering: best candidate is first
     assert top5[0].profile.preferences.interests == candidates[3].profile.preferences.interests
 
 
-def test_random_tiebreaker_effect(monkeypatch):
-    eng = RecommendationEngine()
+def test_random_tiebreaker_effect(engine, monkeypatch):
     a = make_user_with_profile(1)
     b1 = make_user_with_profile(2)
     b2 = make_user_with_profile(3)
 
     # force deterministic different random values
     monkeypatch.setattr(random, "random", lambda: 0.0)
-    s1 = eng.score(a, b1)
+    s1 = engine.score(a, b1)
     # change random to a higher value
     monkeypatch.setattr(random, "random", lambda: 1.0)
-    s2 = eng.score(a, b2)
+    s2 = engine.score(a, b2)
     # since base characteristics similar, s2 likely >= s1 due to bigger random
     assert s2 >= s1
 
 
-def test_score_is_finite(monkeypatch):
-    eng = RecommendationEngine()
+def test_score_is_finite(engine, monkeypatch):
     a = make_user_with_profile(1)
     b = make_user_with_profile(2)
     monkeypatch.setattr(random, "random", lambda: 0.5)
-    s = eng.score(a, b)
+    s = engine.score(a, b)
     assert isinstance(s, float)
     assert not (s != s)  # not NaN
 
 
-def test_compute_matches_excludes_self_and_ordering(monkeypatch):
-    eng = RecommendationEngine()
+def test_compute_matches_excludes_self_and_ordering(engine, monkeypatch):
     a = make_user_with_profile(1)
     # create candidates including 'a' itself
-    candidates = [a] + [make_user_with_profile(i) for i in range(2, 7)]
+    candidates = [a] + make_users(5, start=2)
     # make candidate 2 clearly the best match
     candidates[1].profile.preferences.interests = ["hiking", "coffee"]
     a.profile.preferences.interests = ["hiking"]
 
     monkeypatch.setattr(random, "random", lambda: 0.0)
 
-    top3 = eng.compute_matches(a, candidates, top_k=3)
+    top3 = engine.compute_matches(a, candidates, top_k=3)
     # self should be excluded
     assert all(u.user_id != a.user_id for u in top3)
     # best candidate (candidate 2) should be first
     assert top3[0].profile.preferences.interests == candidates[1].profile.preferences.interests
+
+
+def test_candidate_matrix_scores_match_scalar_score(engine, monkeypatch):
+    a = make_user_with_profile(1, interests=["hiking", "coffee"], lat=37.0, lon=-122.0)
+    a.profile.preferences.gender_preference = [Gender.FEMALE, Gender.NONBINARY]
+    a.profile.preferences.age_min = 25
+    a.profile.preferences.age_max = 35
+    a.profile.preferences.max_distance_km = 20
+
+    no_location = make_user_with_profile(5, gender=Gender.NONBINARY, age=45, interests=["coffee"])
+    no_gender = make_user_with_profile(6, age=18, interests=["hiking", "coffee", "music"], lat=37.5, lon=-121.0)
+    no_gender.profile.gender = None
+    no_birthdate = make_user_with_profile(7, lat=36.0, lon=-122.0)
+    no_birthdate.profile.birthdate = None
+    pool = [
+        make_user_with_profile(2, gender=Gender.FEMALE, age=30, interests=["hiking"], lat=37.01, lon=-122.01),
+        make_user_with_profile(3, gender=Gender.MALE, age=22, interests=["movies"], lat=38.0, lon=-123.0),
+        make_user_with_profile(4, gender=Gender.OTHER, age=60, lat=37.1, lon=-122.1),
+        no_location,
+        no_gender,
+        no_birthdate,
+        User(email="noprofile@example.com"),
+    ]
+
+    monkeypatch.setattr(random, "random", lambda: 0.0)
+    expected = [engine.score(a, b) for b in pool]
+    got = CandidateMatrix(pool).scores(a, np.zeros(len(pool)))
+    assert got.tolist() == pytest.approx(expected, abs=1e-3)
+
+
+def test_compute_matches_top_k_larger_than_pool(engine, monkeypatch):
+    a = make_user_with_profile(1, interests=["hiking"])
+    candidates = make_users(3, start=2)
+    candidates[1].profile.preferences.interests = ["hiking"]
+
+    top = engine.compute_matches(a, candidates, top_k=10)
+    assert len(top) == 3
+    assert top[0] is candidates[1]
+    assert engine.compute_matches(a, [a], top_k=3) == []
+
+
+def test_compute_matches_uses_overridden_score():
+    class ByNameEngine(RecommendationEngine):
+        def score(self, a, b):
+            return float(b.profile.display_name[-1])
+
+    a = make_user_with_profile(1)
+    candidates = [make_user_with_profile(i) for i in (3, 7, 2, 5)]
+    top = ByNameEngine().compute_matches(a, candidates, top_k=2)
+    assert [u.profile.display_name for u in top] == ["User7", "User5"]
+
+
+def test_top_k_indices_orders_best_first():
+    scores = np.array([0.5, 3.0, -1.0, 2.0, 1.0])
+    assert top_k_indices(scores, 2).tolist() == [1, 3]
+    assert top_k_indices(scores, 10).tolist() == [1, 3, 4, 0, 2]
+
+
+def test_numba_kernel_matches_numpy_scores(monkeypatch):
+    pytest.importorskip("numba")
+    a = make_user_with_profile(1, interests=["hiking", "coffee"], lat=37.0, lon=-122.0)
+    a.profile.preferences.gender_preference = [Gender.FEMALE, Gender.OTHER]
+    a.profile.preferences.age_min = 25
+    a.profile.preferences.age_max = 35
+    a.profile.preferences.max_distance_km = 30
+    genders = list(Gender)
+    pool = [
+        make_user_with_profile(
+            i, gender=genders[i % 4], age=18 + i % 40, interests=["hiking", "music", "coffee"][: i % 4],
+            lat=37.0 + (i % 13) * 0.05, lon=-122.0 - (i % 7) * 0.05,
+        )
+        for i in range(2, 40)
+    ]
+    pool[5].profile.location = None
+    pool[6].profile.gender = None
+    pool.append(User(email="noprofile@example.com"))
+    matrix = CandidateMatrix(pool)
+    noise = np.linspace(0.0, 2.0, len(pool))
+
+    expected = matrix.scores(a, noise)
+    monkeypatch.setattr(engine_module, "KERNEL_MIN_CANDIDATES", 0)
+    got = matrix.scores(a, noise)
+    assert got.tolist() == pytest.approx(expected.tolist(), abs=1e-3)
+
+
+def test_interest_overlap_follows_reassigned_interests(engine, monkeypatch):
+    a = make_user_with_profile(1, interests=["hiking", "coffee"])
+    b = make_user_with_profile(2, interests=["movies"])
+    monkeypatch.setattr(random, "random", lambda: 0.0)
+
+    before = engine.score(a, b)
+    b.profile.preferences.interests = ["coffee", "hiking", "coffee"]
+    assert b.profile.preferences._interest_set == frozenset({"coffee", "hiking"})
+    assert engine.score(a, b) == pytest.approx(before + 10.0)
+
+
+def test_in_place_interest_edits_reach_every_scoring_path(engine, monkeypatch):
+    monkeypatch.setattr(engine_module, "_noise", lambda n: np.zeros(n))
+    a = make_user_with_profile(1, interests=["coffee"])
+    b = make_user_with_profile(2, interests=["movies"])
+    c = make_user_with_profile(3, interests=["movies"])
+    pool = [b, c]
+    before = engine.base_score(a, b)
+    assert engine.compute_matches(a, pool, top_k=1) == [b]
+
+    c.profile.preferences.interests.append("coffee")
+    assert engine.base_score(a, c) == pytest.approx(before + 5.0)
+    assert engine.score_batch(a, pool).tolist() == pytest.approx([before, before + 5.0])
+    assert engine.compute_matches(a, pool, top_k=1) == [c]
+
+    del c.profile.preferences.interests[-1]
+    a.profile.preferences.interests += ["movies"]
+    assert engine.score_batch(a, pool).tolist() == pytest.approx([before + 5.0] * 2)
+
+
+def test_score_is_base_score_plus_bounded_noise(engine):
+    a = make_user_with_profile(1, interests=["hiking"])
+    b = make_user_with_profile(2, interests=["hiking"])
+    base = engine.base_score(a, b)
+    assert base == engine.base_score(a, b)
+    for _ in range(20):
+        assert base <= engine.score(a, b) < base + 2.0
+
+
+def test_score_batch_matches_scalar_within_noise(engine):
+    a = make_user_with_profile(1, interests=["hiking"], lat=37.0, lon=-122.0)
+    pool = [make_user_with_profile(i, age=20 + 3 * i, interests=["hiking"] if i % 2 else [], lat=37.0 + i * 0.1, lon=-122.0) for i in range(2, 9)]
+    batch = engine.score_batch(a, pool)
+    base = np.array([engine.base_score(a, b) for b in pool])
+    assert batch.shape == (len(pool),)
+    assert np.all(batch >= base - 1e-3) and np.all(batch < base + 2.0 + 1e-3)
+
+
+def test_compute_matches_masks_every_self_row(engine):
+    a = make_user_with_profile(1)
+    others = make_users(3, start=2)
+    candidates = [a, others[0], a, others[1], others[2]]
+
+    matrix = CandidateMatrix(candidates)
+    assert matrix.rows_of(a).tolist() == [True, False, True, False, False]
+    top = engine.compute_matches(a, candidates, top_k=10)
+    assert sorted(u.profile.display_name for u in top) == ["User2", "User3", "User4"]
+
+
+def test_base_score_cache_follows_profile_changes():
+    eng = RecommendationEngine(score_cache_size=2)
+    a = make_user_with_profile(1, interests=["hiking"])
+    b = make_user_with_profile(2, interests=[])
+
+    before = eng.base_score(a, b)
+    assert eng.base_score(a, b) == before
+    b.profile.preferences.interests = ["hiking"]
+    assert eng.base_score(a, b) == pytest.approx(before + 5.0)
+    a.profile.preferences.age_min = 40
+    assert eng.base_score(a, b) < before
+    assert len(eng._score_cache) == 2
+
+
+def test_compute_matches_parallel_matches_serial(engine, monkeypatch):
+    monkeypatch.setattr(engine_module, "PARALLEL_MIN_CANDIDATES", 0)
+    monkeypatch.setattr(engine_module, "_noise", lambda n: np.linspace(0.0, 1.0, n))
+    shard_sizes = []
+    real_scores = CandidateMatrix.scores
+
+    def spy(self, user, noise, use_kernel=True):
+        if not use_kernel:
+            shard_sizes.append(len(self))
+        return real_scores(self, user, noise, use_kernel)
+
+    monkeypatch.setattr(CandidateMatrix, "scores", spy)
+    a = make_user_with_profile(1, interests=["hiking", "coffee"], lat=37.0, lon=-122.0)
+    pool = [
+        make_user_with_profile(i, age=20 + i % 25, interests=["hiking", "coffee", "music"][: i % 4], lat=37.0 + (i % 9) * 0.1, lon=-122.0)
+        for i in range(2, 60)
+    ]
+    pool.insert(10, a)
+
+    expected = engine.compute_matches(a, pool, top_k=15)
+    assert engine.compute_matches_parallel(a, pool, top_k=15, workers=4) == expected
+    assert sorted(shard_sizes) == [14, 15, 15, 15]
+    assert engine.compute_matches_parallel(a, pool, top_k=15, workers=100) == expected
+
+
+def test_compute_matches_parallel_defers_to_kernel_path(engine, monkeypatch):
+    calls = []
+    monkeypatch.setattr(engine_module.engine_kernels, "HAVE_NUMBA", True)
+    monkeypatch.setattr(engine_module, "KERNEL_MIN_CANDIDATES", 4)
+    monkeypatch.setattr(engine_module, "PARALLEL_MIN_CANDIDATES", 0)
+    monkeypatch.setattr(engine, "compute_matches", lambda *args: calls.append(len(args[1])) or [])
+    a = make_user_with_profile(1)
+
+    engine.compute_matches_parallel(a, make_users(3, start=2), workers=2)
+    assert calls == []
+    engine.compute_matches_parallel(a, make_users(4, start=2), workers=2)
+    assert calls == [4]
+
+
+def test_compute_matches_parallel_shards_overridden_score(monkeypatch):
+    threads = set()
+
+    class SlowEngine(RecommendationEngine):
+        def score(self, a, b):
+            threads.add(threading.get_ident())
+            time.sleep(0.001)
+            return float(b.profile.display_name[4:])
+
+    monkeypatch.setattr(engine_module, "PARALLEL_MIN_CANDIDATES", 0)
+    a = make_user_with_profile(1)
+    pool = make_users(40, start=2)
+    pool.insert(5, a)
+    eng = SlowEngine()
+
+    expected = eng.compute_matches(a, pool, top_k=5)
+    assert [u.profile.display_name for u in expected] == ["User41", "User40", "User39", "User38", "User37"]
+    threads.clear()
+    assert eng.compute_matches_parallel(a, pool, top_k=5, workers=4) == expected
+    assert len(threads) > 1
+
+
+def test_compute_matches_parallel_evicts_score_cache_safely(monkeypatch):
+    class DeterministicEngine(RecommendationEngine):
+        def score(self, a, b):
+            return self.base_score(a, b)
+
+    monkeypatch.setattr(engine_module, "PARALLEL_MIN_CANDIDATES", 0)
+    a = make_user_with_profile(1, interests=["hiking"], lat=37.0, lon=-122.0)
+    pool = [make_user_with_profile(i, age=20 + i % 25, lat=37.0 + (i % 7) * 0.1, lon=-122.0) for i in range(2, 402)]
+    eng = DeterministicEngine(score_cache_size=8)
+
+    expected = eng.compute_matches(a, pool, top_k=10)
+    for _ in range(5):
+        assert eng.compute_matches_parallel(a, pool, top_k=10, workers=8) == expected
+    assert len(eng._score_cache) <= 8
+
+
+def test_score_batch_dispatches_large_pools_to_kernel(engine, monkeypatch):
+    calls = []
+    real = engine_module.engine_kernels.score_all
+    monkeypatch.setattr(engine_module.engine_kernels, "HAVE_NUMBA", True)
+    monkeypatch.setattr(engine_module.engine_kernels, "score_all", lambda *args: calls.append(len(args[1])) or real(*args))
+    monkeypatch.setattr(engine_module, "KERNEL_MIN_CANDIDATES", 4)
+    a = make_user_with_profile(1, interests=["hiking"], lat=37.0, lon=-122.0)
+
+    engine.score_batch(a, make_users(3, start=2, lat=37.1, lon=-122.0))
+    assert calls == []
+    scores = engine.score_batch(a, make_users(4, start=2, lat=37.1, lon=-122.0))
+    assert calls == [4]
+    base = engine.base_score(a, make_user_with_profile(2, lat=37.1, lon=-122.0))
+    assert np.all(scores >= base - 1e-3) and np.all(scores < base + 2.0 + 1e-3)
+
+
+def test_candidate_matrix_is_reused_until_candidates_change():
+    eng = RecommendationEngine()
+    a = make_user_with_profile(1, interests=["hiking"])
+    pool = make_users(4, start=2)
+
+    eng.compute_matches(a, pool, top_k=2)
+    matrix = eng._matrix
+    eng.compute_matches(a, pool, top_k=3)
+    assert eng.score_batch(a, pool) is not None and eng._matrix is matrix
+
+    pool[2].profile.preferences.interests = ["hiking"]
+    assert eng.compute_matches(a, pool, top_k=1) == [pool[2]]
+    assert eng._matrix is not matrix
+
+    matrix = eng._matrix
+    pool.append(make_user_with_profile(9))
+    eng.compute_matches(a, pool, top_k=1)
+    assert eng._matrix is not matrix and len(eng._matrix) == 5
+
+
+def test_batch_noise_comes_from_module_rng(monkeypatch):
+    monkeypatch.setattr(engine_module, "_rng", np.random.default_rng(7))
+    first = engine_module._noise(1000)
+    monkeypatch.setattr(engine_module, "_rng", np.random.default_rng(7))
+    assert first.dtype == np.float32
+    assert np.array_equal(first, engine_module._noise(1000))
+    assert first.min() >= 0.0 and first.max() < 2.0
+
+
+@pytest.mark.parametrize("lat, lon, radius", [(37.0, -122.0, 50.0), (89.5, 10.0, 300.0), (-60.0, 179.9, 1000.0), (0.0, -180.0, 5000.0)])
+def test_candidate_matrix_near_never_drops_rows_inside_radius(lat, lon, radius):
+    rng = np.random.default_rng(0)
+    lats = np.concatenate([rng.uniform(-90, 90, 2000), np.clip(lat + rng.normal(0, 5, 2000), -90, 90)])
+    lons = np.concatenate([rng.uniform(-180, 180, 2000), (lon + rng.normal(0, 20, 2000) + 180) % 360 - 180])
+    pool = [make_user_with_profile(i, lat=float(la), lon=float(lo)) for i, (la, lo) in enumerate(zip(lats, lons))]
+    matrix = CandidateMatrix(pool)
+
+    origin = Location(lat=lat, lon=lon)
+    keep = matrix.near(origin, radius)
+    inside = np.array([origin.distance_km_to(u.profile.location) <= radius for u in pool])
+    assert not np.any(inside & ~keep)
+    assert not keep.all()
+
+
+def test_prefiltered_compute_matches_equals_full_scoring(monkeypatch):
+    monkeypatch.setattr(engine_module, "_noise", lambda n: np.zeros(n))
+    a = make_user_with_profile(1, interests=["hiking"], lat=37.0, lon=-122.0)
+    a.profile.preferences.max_distance_km = 5
+    near = [make_user_with_profile(i, age=20 + i, interests=["hiking"] if i % 2 else [], lat=37.0 + i * 0.01, lon=-122.0) for i in range(2, 8)]
+    far = [make_user_with_profile(i, interests=["hiking"], lat=48.0, lon=2.0) for i in range(8, 40)]
+    pool = far[:10] + near + far[10:] + [a]
+
+    def full(k):
+        matrix = CandidateMatrix(pool)
+        return engine_module._select(a, matrix, matrix.scores(a, np.zeros(len(pool))), k)
+
+    eng = RecommendationEngine()
+    assert not eng._matrix_for(pool).near(a.profile.location, 235.0).all()
+    # 3 fits inside the near group; 10 forces the fallback to the whole pool
+    for k in (3, 10):
+        assert eng.compute_matches(a, pool, top_k=k) == full(k)
+
+
+def test_interests_past_the_registry_cap_still_count(engine, monkeypatch):
+    monkeypatch.setattr(models, "_INTEREST_BITS", {})
+    monkeypatch.setattr(models, "MAX_INTEREST_BITS", 2)
+    monkeypatch.setattr(random, "random", lambda: 0.0)
+    a = make_user_with_profile(1, interests=["hiking", "coffee", "chess", "go"], lat=37.0, lon=-122.0)
+    vocab = ["hiking", "coffee", "chess", "go", "tea"]
+    pool = [make_user_with_profile(i, interests=vocab[i % 5:i % 5 + 1 + i % 3], lat=37.0 + i * 0.01, lon=-122.0) for i in range(2, 20)]
+    pool.append(User(email="noprofile@example.com"))
+    matrix = CandidateMatrix(pool)
+    assert matrix.interests_mask.shape[1] == 1
+
+    expected = [engine.score(a, b) for b in pool]
+    assert matrix.scores(a, np.zeros(len(pool))).tolist() == pytest.approx(expected, abs=1e-3)
+    monkeypatch.setattr(engine_module, "KERNEL_MIN_CANDIDATES", 0)
+    assert matrix.scores(a, np.zeros(len(pool))).tolist() == pytest.approx(expected, abs=1e-3)
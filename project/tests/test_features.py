@@ -0,0 +1,43 @@
+from datetime import date
+
+from project.features import features_for
+from project.models import User, Profile, Photo, Location, Gender
+from project.storage import InMemoryDB
+
+
+def make_user_with_profile(index: int, age: int = 30):
+    u = User(email=f"u{index}@example.com")
+    today = date.today()
+    p = Profile(display_name=f"User{index}", birthdate=date(today.year - age, 1, 1), gender=Gender.FEMALE)
+    p.add_photo(Photo())
+    u.update_profile(p)
+    return u
+
+
+def test_add_user_precomputes_features():
+    db = InMemoryDB()
+    u = make_user_with_profile(1)
+    db.add_user(u)
+    f = u._features
+    assert f is not None
+    assert (f.age_years, f.complete_pct, f.has_location) == (30, 66, False)
+    assert features_for(u) is f
+
+
+def test_features_rebuilt_after_profile_changes():
+    db = InMemoryDB()
+    u = make_user_with_profile(1)
+    db.add_user(u)
+    before = features_for(u)
+
+    u.profile.location = Location(lat=1.0, lon=2.0)
+    after = features_for(u)
+    assert after is not before
+    assert (after.lat, after.lon, after.has_location) == (1.0, 2.0, True)
+
+    u.profile.preferences.interests = ["hiking"]
+    assert features_for(u).interest_mask == u.profile.preferences._interest_mask
+
+    u.update_profile(Profile(display_name="fresh"))
+    assert features_for(u).age_years == 0
+    assert features_for(User()) is None
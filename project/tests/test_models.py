@@ -0,0 +1,250 @@
+import dataclasses
+import hashlib
+import sys
+import uuid
+import weakref
+from datetime import date, datetime, timedelta
+from unittest import mock
+
+import numpy as np
+import pytest
+from hypothesis import given, strategies as st
+
+from project import models
+from project.utils import _age, age_from_birthdate, gen_uuid, hash_password
+from project.models import User, Profile, Photo, Location, Preferences, Gender, Swipe, Conversation, Message, Payment, Subscription, Notification, _GENDER_ORD
+
+
+def make_user_with_profile(index: int, age: int = 30):
+    u = User(email=f"u{index}@example.com")
+    today = date.today()
+    p = Profile(display_name=f"User{index}", birthdate=date(today.year - age, 1, 1))
+    p.add_photo(Photo())
+    u.update_profile(p)
+    return u
+
+
+def test_profile_caches_follow_mutations():
+    u = make_user_with_profile(1, age=30)
+    p = u.profile
+    assert p.complete_percentage() == 50
+    assert p.age() == 30
+
+    p.bio = "now with a bio"
+    assert p.complete_percentage() == 66
+    p.remove_photo(p.photos[0].photo_id)
+    assert p.complete_percentage() == 50
+
+    p.birthdate = date(date.today().year - 40, 1, 1)
+    assert p.age() == 40
+
+
+def test_profile_caches_follow_in_place_photo_edits():
+    p = Profile(display_name="Solo")
+    assert p.complete_percentage() == 16
+    revision, digest = p._revision, p.profile_hash
+    p.photos.append(Photo())
+    assert p.complete_percentage() == Profile(display_name="Solo", photos=[Photo()]).complete_percentage() == 33
+    assert p._revision != revision and p.profile_hash != digest
+    p.photos.clear()
+    assert p.complete_percentage() == 16
+
+
+def test_distance_is_great_circle():
+    equator = Location(lat=0.0, lon=0.0)
+    north = Location(lat=60.0, lon=0.0)
+    assert equator.distance_km_to(Location(lat=0.0, lon=1.0)) == pytest.approx(111.19, abs=0.01)
+    assert north.distance_km_to(Location(lat=60.0, lon=1.0)) == pytest.approx(55.60, abs=0.01)
+    assert equator.distance_km_to(Location(lat=0.0, lon=180.0)) == pytest.approx(20015.09, abs=0.01)
+
+    lats = np.array([60.0, 61.0, 60.0, 60.001], dtype=np.float32)
+    lons = np.array([1.0, 0.0, 0.0, 0.0], dtype=np.float32)
+    expected = [north.distance_km_to(Location(lat=float(a), lon=float(b))) for a, b in zip(lats, lons)]
+    got = north.distances_km_to_array(lats, lons)
+    assert got.dtype == np.float32
+    assert got.tolist() == pytest.approx(expected, abs=1e-3)
+
+
+def test_gender_mask_follows_preference_changes():
+    prefs = Preferences(gender_preference=[Gender.MALE])
+    assert prefs._gender_mask == 1 << _GENDER_ORD[Gender.MALE]
+    prefs.gender_preference = [Gender.FEMALE, Gender.OTHER]
+    assert (prefs._gender_mask >> _GENDER_ORD[Gender.OTHER]) & 1
+    assert not (prefs._gender_mask >> _GENDER_ORD[Gender.MALE]) & 1
+
+    prefs.gender_preference.append(Gender.MALE)
+    assert (prefs._gender_mask >> _GENDER_ORD[Gender.MALE]) & 1
+    prefs.gender_preference.remove(Gender.FEMALE)
+    assert not (prefs._gender_mask >> _GENDER_ORD[Gender.FEMALE]) & 1
+
+
+def test_lazy_ids_are_generated_once_and_overridable():
+    p = Payment(amount=1.0)
+    assert "_payment_id" not in p.__dict__ or p.__dict__["_payment_id"] is None
+    first = p.payment_id
+    assert isinstance(first, uuid.UUID)
+    assert p.payment_id == first
+    assert p.to_dict()["payment_id"] == str(first)
+
+    fixed = uuid.uuid4()
+    assert Message(message_id=fixed).message_id == fixed
+    assert Message().message_id != Message().message_id
+
+
+def test_lazy_timestamps_materialize_as_naive_utc():
+    before = datetime.utcnow()
+    p = Payment(amount=1.0)
+    assert type(p.__dict__["_created_at"]) is int
+    created = p.created_at
+    assert isinstance(created, datetime) and created.tzinfo is None
+    assert before - timedelta(seconds=1) <= created <= datetime.utcnow()
+    assert p.created_at is created
+
+    fixed = datetime(2020, 1, 1)
+    assert Message(sent_at=fixed).sent_at == fixed
+
+
+def test_gen_uuid_is_a_regular_v4_uuid():
+    u = gen_uuid()
+    assert isinstance(u, uuid.UUID)
+    assert u.version == 4 and u.variant == uuid.RFC_4122
+    assert uuid.UUID(str(u)) == u and hash(uuid.UUID(str(u))) == hash(u)
+    assert gen_uuid() != u
+
+
+def test_cached_age_rolls_over_at_midnight_on_the_birthday():
+    bd = date(1990, 6, 15)
+    eve, birthday = date(2020, 6, 14), date(2020, 6, 15)
+    assert _age(bd, eve) == 29
+    assert _age(bd, birthday) == 30
+    assert _age(bd, eve) == 29
+    assert age_from_birthdate(bd, eve) == 29
+    assert age_from_birthdate(bd, birthday) == 30
+
+
+def test_interests_are_interned_in_order():
+    word = "".join(["bou", "ldering"])
+    prefs = Preferences(interests=[word, "coffee"])
+    assert prefs.interests == ["bouldering", "coffee"]
+    assert prefs.interests[0] is sys.intern("bouldering")
+    assert all(w in prefs._interest_set for w in ("bouldering", "coffee"))
+
+
+def test_tracked_lists_accept_keyword_arguments():
+    prefs = Preferences(interests=["coffee", "art", "hiking"], gender_preference=[Gender.MALE, Gender.OTHER])
+    prefs.interests.sort(key=str.lower, reverse=True)
+    assert prefs.interests == ["hiking", "coffee", "art"]
+    prefs.gender_preference.sort(key=lambda g: g.value, reverse=True)
+    assert prefs.gender_preference == [Gender.OTHER, Gender.MALE]
+
+    p = Profile()
+    for order in (2, 0, 1):
+        p.photos.append(Photo(order=order))
+    revision = p._revision
+    p.photos.sort(key=lambda ph: ph.order, reverse=True)
+    assert [ph.order for ph in p.photos] == [2, 1, 0]
+    assert p._revision == revision + 1
+
+
+def test_hash_password_is_a_32_char_blake2b_digest():
+    digest = hash_password("password123")
+    assert digest == hashlib.blake2b(b"password123", digest_size=16).hexdigest()
+    assert len(digest) == 32 and int(digest, 16) >= 0
+    assert hash_password("password124") != digest
+
+
+def test_verify_password():
+    u = User(email="pw@example.com")
+    u.set_password("password123")
+    assert u.verify_password("password123")
+    assert not u.verify_password("password124")
+
+
+def test_hot_models_use_slots():
+    u = make_user_with_profile(1)
+    for obj in (u, u.profile, u.profile.preferences, u.profile.photos[0], Location(lat=0.0, lon=0.0), Subscription(user=u), Notification(user=u)):
+        assert not hasattr(obj, "__dict__")
+        assert weakref.ref(obj)() is obj
+
+
+def test_location_is_immutable_and_interns_names():
+    loc = Location(lat=1.0, lon=2.0, city="".join(["Demo", "City"]))
+    assert loc.city is sys.intern("DemoCity")
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        loc.lat = 3.0
+
+
+def test_conversation_tracks_participant_ids():
+    a, b, c = (make_user_with_profile(i) for i in range(3))
+    conv = Conversation(participants=[a, b])
+    with pytest.raises(ValueError):
+        conv.send_message(Message(sender=c, content="hi"))
+
+    with mock.patch.object(Conversation, "_field_changed") as rebuild:
+        conv.add_participant(c)
+        conv.add_participant(c)
+    rebuild.assert_not_called()
+    assert conv.participants == [a, b, c]
+    conv.send_message(Message(sender=c, content="hi"))
+    assert len(conv.messages) == 1
+
+
+def test_conversation_ids_follow_direct_participant_edits():
+    a, b, c = (make_user_with_profile(i) for i in range(3))
+    conv = Conversation()
+    conv.participants.append(a)
+    conv.send_message(Message(sender=a, content="hi"))
+
+    conv.participants = [b]
+    conv.send_message(Message(sender=b, content="hi"))
+    with pytest.raises(ValueError):
+        conv.send_message(Message(sender=a, content="hi"))
+
+    conv.participants[0] = c
+    with pytest.raises(ValueError):
+        conv.send_message(Message(sender=b, content="hi"))
+    conv.add_participant(c)
+    assert conv.participants == [c]
+    assert len(conv.messages) == 2
+
+
+def test_user_id_str_is_memoized_and_follows_reassignment():
+    u = User(email="id@example.com")
+    assert u.id_str == str(u.user_id)
+    assert u.id_str is u.id_str
+    u.user_id = uuid.uuid4()
+    assert u.to_dict()["user_id"] == str(u.user_id)
+    assert Swipe(from_user=u, to_user=u).to_dict()["from_user"] == str(u.user_id)
+
+
+def test_remove_photo_renumbers_following_photos():
+    p = Profile()
+    photos = [Photo() for _ in range(4)]
+    for ph in photos:
+        p.add_photo(ph)
+    p.remove_photo(photos[1].photo_id)
+    assert p.photos == [photos[0], photos[2], photos[3]]
+    assert [ph.order for ph in p.photos] == [0, 1, 2]
+    p.remove_photo(uuid.uuid4())
+    assert len(p.photos) == 3
+
+
+@given(st.lists(st.text(max_size=8), max_size=12), st.lists(st.text(max_size=8), max_size=12))
+def test_interest_overlap_is_exact(a, b):
+    # a private, tiny registry so the random strings neither leak into later tests nor
+    # stay clear of the overflow path
+    with mock.patch.object(models, "_INTEREST_BITS", {}), mock.patch.object(models, "MAX_INTEREST_BITS", 6):
+        pa, pb = Preferences(interests=a), Preferences(interests=b)
+        assert pa._interest_set == frozenset(a)
+        assert pa.shared_interest_count(pb) == len(pa._interest_set & pb._interest_set)
+        assert pa._interest_mask.bit_count() + len(pa._interest_overflow) == len(pa._interest_set)
+
+
+def test_interest_registry_is_capped(monkeypatch):
+    monkeypatch.setattr(models, "_INTEREST_BITS", {})
+    monkeypatch.setattr(models, "MAX_INTEREST_BITS", 2)
+    a = Preferences(interests=["hiking", "coffee", "chess", "go"])
+    b = Preferences(interests=["go", "hiking", "tea"])
+    assert a._interest_mask.bit_length() <= 2 and b._interest_mask.bit_length() <= 2
+    assert a._interest_overflow == {"chess", "go"} and b._interest_overflow == {"go", "tea"}
+    assert a.shared_interest_count(b) == 2
@@ -1,5 +1,5 @@
 from project.storage import InMemoryDB
-from project.models import User, Profile, Preferences, Location, Photo, Swipe, Conversation, Message, Payment, Subscription, Notification, Report
+from project.models import User, Profile, Preferences, Location, Photo, Swipe, Match, Conversation, Message, Payment, Subscription, Notification, Report
 from datetime import date
 
 
@@ -115,3 +115,55 @@ def test_find_user_by_email_case_insensitive():
 def test_find_user_returns_none_when_missing():
     db = InMemoryDB()
     assert db.find_user_by_email("doesnotexist@example.com") is None
+
+
+def test_email_index_keeps_first_registration():
+    db = InMemoryDB()
+    first = User(email="Dup@example.com")
+    second = User(email="dup@EXAMPLE.com")
+    db.add_user(first)
+    db.add_user(second)
+    assert db.find_user_by_email("DUP@example.com") is first
+    assert set(db._email_index) == {u.email.casefold() for u in db.users.values()}
+
+
+def test_find_user_by_email_casefolds_unicode():
+    db = InMemoryDB()
+    u = User(email="Strauß@example.com")
+    db.add_user(u)
+    assert db.find_user_by_email("STRAUSS@EXAMPLE.COM") is u
+
+
+def test_add_match_blocks_swipe_generated_duplicate():
+    db = InMemoryDB()
+    u1 = make_user_with_profile(1)
+    u2 = make_user_with_profile(2)
+    db.add_match(Match(user_a=u2, user_b=u1))
+
+    db.add_swipe(Swipe(from_user=u1, to_user=u2, direction="like"))
+    assert db.add_swipe(Swipe(from_user=u2, to_user=u1, direction="like")) is None
+    assert len(db.matches) == 1
+
+
+def test_latest_swipe_direction_wins():
+    db = InMemoryDB()
+    u1 = make_user_with_profile(1)
+    u2 = make_user_with_profile(2)
+    db.add_swipe(Swipe(from_user=u1, to_user=u2, direction="like"))
+    db.add_swipe(Swipe(from_user=u1, to_user=u2, direction="pass"))
+    assert db.add_swipe(Swipe(from_user=u2, to_user=u1, direction="like")) is None
+
+    m = db.add_swipe(Swipe(from_user=u1, to_user=u2, direction="like"))
+    assert m is not None
+    assert db.match_between(u2, u1) is m
+
+
+def test_find_user_accepts_uuid_or_bytes():
+    db = InMemoryDB()
+    u = make_user_with_profile(1)
+    db.add_user(u)
+    assert db.find_user(u.user_id) is u
+    assert db.find_user(u.user_id.bytes) is u
+    assert db.find_user(b"\0" * 16) is None
+    assert db.find_user(b"") is None
+    assert db.find_user(u.user_id.bytes + b"\0") is None
@@ -1,23 +1,50 @@
 from __future__ import annotations
+import os
+import time
 import uuid
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
+from functools import lru_cache
 import hashlib
-from typing import Any
+from typing import Any, Optional
 
 
 def gen_uuid() -> uuid.UUID:
-    return uuid.uuid4()
+    """Random version-4 UUID, equal in distribution to ``uuid.uuid4()``."""
+    return uuid.UUID(bytes=os.urandom(16), version=4)
 
 
 def now() -> datetime:
     return datetime.utcnow()
 
 
+_EPOCH = datetime(1970, 1, 1)
+
+
+def now_ns() -> int:
+    return time.time_ns()
+
+
+def datetime_from_ns(ns: int) -> datetime:
+    """Naive UTC datetime for a ``now_ns()`` reading, matching what ``now()`` returns."""
+    return _EPOCH + timedelta(microseconds=ns // 1000)
+
+
+@lru_cache(maxsize=1024)
 def hash_password(password: str) -> str:
-    return hashlib.sha256(password.encode("utf-8")).hexdigest()
+    """Digest ``password``; memoized because fixtures and the demo reuse the same plaintexts.
+
+    The cache keeps recent plaintexts in memory. That is acceptable for this
+    in-memory demo, but a real KDF (bcrypt/argon2) should not be cached.
+    """
+    return hashlib.blake2b(password.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def age_from_birthdate(bd: date, today: Optional[date] = None) -> int:
+    return _age(bd, today or date.today())
 
 
-def age_from_birthdate(bd: date) -> int:
-    today = date.today()
+# keyed on today as well, so cached ages roll over at midnight
+@lru_cache(maxsize=8192)
+def _age(bd: date, today: date) -> int:
     years = today.year - bd.year - ((today.month, today.day) < (bd.month, bd.day))
     return years